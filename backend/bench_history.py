@@ -0,0 +1,122 @@
+# backend/bench_history.py
+
+# Measures how much slower item writes get because of the history log.
+# It times the same item updates on a throwaway database, switching the
+# history triggers off ("plain", how updates worked before history)
+# and on ("history"), at three levels:
+#   1. "db save": just item.save(), the bare database write
+#   2. "PUT route": the PUT /items/{id} handler plus the login check
+#   3. "HTTP PUT": a whole PUT /items/{id} request sent to the app,
+#      which is what one "write" costs a user. The target ("a few
+#      percent") is for this one.
+#
+# Run it with:  python bench_history.py
+
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from tortoise import Tortoise, run_async
+
+from auth import create_access_token
+from main import app, get_current_user, update_item
+from models import User, Category, Item, Item_Pydantic_IN
+from history import install_history_triggers
+
+ITEMS = 200      # How many items we update
+ROUNDS = 5       # How many times we update each of them
+REPEATS = 9      # How many times we time each mode
+
+
+async def remove_history_triggers(connection):
+    _, rows = await connection.execute_query(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+    )
+    for row in rows:
+        await connection.execute_script(f'DROP TRIGGER "{row["name"]}"')
+
+
+def new_data(item, round_number):
+    return {**item.data, "Page Count": round_number, "Status": f"Round {round_number}"}
+
+
+async def time_saves(items, token):
+    started = time.perf_counter()
+    for round_number in range(ROUNDS):
+        for item in items:
+            item.data = new_data(item, round_number)
+            await item.save()
+    return time.perf_counter() - started
+
+
+async def time_routes(items, token):
+    started = time.perf_counter()
+    for round_number in range(ROUNDS):
+        for item in items:
+            item.data = new_data(item, round_number)
+            user = await get_current_user(token)
+            await update_item(item.id, Item_Pydantic_IN(data=item.data), user)
+    return time.perf_counter() - started
+
+
+async def time_requests(items, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        for round_number in range(ROUNDS):
+            for item in items:
+                item.data = new_data(item, round_number)
+                await client.put(f"/items/{item.id}", json={"data": item.data}, headers=headers)
+        return time.perf_counter() - started
+
+
+async def compare(label, time_updates, items, token, connection):
+    # Warm up, then alternate the two modes so neither gets an unfair
+    # advantage. Disk syncs make single runs noisy, so we print medians.
+    await time_updates(items, token)
+    plain, history = [], []
+    for _ in range(REPEATS):
+        await remove_history_triggers(connection)
+        plain.append(await time_updates(items, token))
+        await install_history_triggers(connection)
+        history.append(await time_updates(items, token))
+
+    writes = ITEMS * ROUNDS
+    overheads = [h / p - 1 for p, h in zip(plain, history)]
+    print(f"{label}:")
+    print(f"  plain:    {statistics.median(plain) / writes * 1e6:8.1f} us per write")
+    print(f"  history:  {statistics.median(history) / writes * 1e6:8.1f} us per write")
+    print(f"  overhead: {statistics.median(overheads) * 100:+.1f}%")
+
+
+async def run_benchmark():
+    db_dir = tempfile.mkdtemp()
+    await Tortoise.init(
+        db_url=f"sqlite://{os.path.join(db_dir, 'bench.sqlite3')}",
+        modules={"models": ["models"]},
+    )
+    try:
+        await Tortoise.generate_schemas()
+        connection = Tortoise.get_connection("default")
+
+        user = await User.create(username="bench@example.com", password="x")
+        category = await Category.create(name="Books", owner=user)
+        await Item.bulk_create([
+            Item(category=category, data={"Title": f"Book {i}", "Author": "Someone", "Status": "Unread"})
+            for i in range(ITEMS)
+        ])
+        items = await Item.filter(category=category)
+        token = create_access_token(data={"sub": user.username})
+
+        await compare("db save", time_saves, items, token, connection)
+        await compare("PUT route", time_routes, items, token, connection)
+        await compare("HTTP PUT", time_requests, items, token, connection)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    run_async(run_benchmark())
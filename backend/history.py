@@ -0,0 +1,277 @@
+# backend/history.py
+
+# The "undo history" for items.
+#
+# Every time an item's 'data' changes, one ItemRevision row is appended
+# holding a small diff with just enough to undo the change:
+#
+#   {"old":   {"Status": "Reading",     <- what the changed or removed
+#              "Notes": "..."},            keys held before
+#    "added": ["Rating"]}               <- keys that didn't exist before
+#
+# The new values aren't stored: they are the next revision's "old"
+# values (or the item's current data), so storing them would only make
+# every write bigger.
+#
+# The rows are written by SQLite triggers (HISTORY_TRIGGERS_SQL below),
+# so they are part of the same statement as the change itself: nothing
+# can change an item without leaving history, not even a cloned
+# category or a deleted one, and it costs no extra round trips.
+#
+# Because we keep the "old" values, we can walk BACKWARDS from the
+# item's current data to see what it looked like at any earlier time.
+# That also means old revisions can simply be deleted (retention) or
+# merged together (compaction) without breaking newer history.
+
+import asyncio
+import logging
+from datetime import timedelta
+
+from tortoise import timezone
+from tortoise.expressions import Q
+from tortoise.functions import Count
+from tortoise.transactions import in_transaction
+
+from models import BackgroundJob, ItemRevision
+from scheduler import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+HISTORY_RETENTION_DAYS = 365   # Revisions older than this are deleted
+HISTORY_COMPACT_DAYS = 30      # Revisions older than this are merged per item
+MAINTENANCE_HOURS = 24         # How often retention/compaction runs
+MAINTENANCE_CHECK_SECONDS = 3600  # How often each worker checks if it's due
+MAINTENANCE_LEASE_HOURS = 6    # How long a worker may hold the job
+COMPACT_BATCH = 500            # Items compacted per round
+
+
+# Same text format Tortoise uses to save a DatetimeField in SQLite
+_NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f000+00:00', 'now')"
+
+HISTORY_TRIGGERS_SQL = f"""
+DROP TRIGGER IF EXISTS "item_history_insert";
+CREATE TRIGGER "item_history_insert" AFTER INSERT ON "item"
+BEGIN
+    INSERT INTO "itemrevision" ("item_id", "owner_id", "category_id", "created_at", "action", "diff")
+    SELECT NEW."id", "owner_id", NEW."category_id", {_NOW_SQL}, 'create',
+           json_object('old', json('{{}}'),
+                       'added', (SELECT json_group_array("key") FROM json_each(NEW."data")))
+    FROM "category" WHERE "id" = NEW."category_id";
+END;
+
+DROP TRIGGER IF EXISTS "item_history_update";
+CREATE TRIGGER "item_history_update" AFTER UPDATE OF "data" ON "item"
+WHEN NEW."data" IS NOT OLD."data"
+BEGIN
+    INSERT INTO "itemrevision" ("item_id", "owner_id", "category_id", "created_at", "action", "diff")
+    SELECT NEW."id", "owner_id", NEW."category_id", {_NOW_SQL}, 'update', "diff"
+    FROM "category", (
+        -- Pairs up the old and new keys. json_each turns true/false
+        -- into 1/0, so "type" is compared too (and put back for "old").
+        SELECT json_object(
+            'old', (SELECT json_group_object(o."key", CASE o."type"
+                                                WHEN 'true' THEN json('true')
+                                                WHEN 'false' THEN json('false')
+                                                ELSE o."value" END)
+                    FROM json_each(OLD."data") AS o
+                    LEFT JOIN json_each(NEW."data") AS n ON n."key" = o."key"
+                    WHERE n."type" IS NOT o."type" OR n."value" IS NOT o."value"),
+            'added', (SELECT json_group_array(n."key")
+                      FROM json_each(NEW."data") AS n
+                      WHERE NOT EXISTS (SELECT 1 FROM json_each(OLD."data") AS o
+                                        WHERE o."key" = n."key"))
+        ) AS "diff"
+    )
+    -- Only the key order changed: nothing to undo
+    WHERE "category"."id" = NEW."category_id" AND "diff" <> '{{"old":{{}},"added":[]}}';
+END;
+
+-- Skipped when the whole category is being deleted: the cascade runs
+-- after the category row is gone, and "category_history_delete" has
+-- already logged those items.
+DROP TRIGGER IF EXISTS "item_history_delete";
+CREATE TRIGGER "item_history_delete" AFTER DELETE ON "item"
+WHEN EXISTS (SELECT 1 FROM "category" WHERE "id" = OLD."category_id")
+BEGIN
+    INSERT INTO "itemrevision" ("item_id", "owner_id", "category_id", "created_at", "action", "diff")
+    SELECT OLD."id", "owner_id", OLD."category_id", {_NOW_SQL}, 'delete',
+           json_object('old', json(OLD."data"), 'added', json('[]'))
+    FROM "category" WHERE "id" = OLD."category_id";
+END;
+
+DROP TRIGGER IF EXISTS "category_history_delete";
+CREATE TRIGGER "category_history_delete" BEFORE DELETE ON "category"
+BEGIN
+    INSERT INTO "itemrevision" ("item_id", "owner_id", "category_id", "created_at", "action", "diff")
+    SELECT "id", OLD."owner_id", "category_id", {_NOW_SQL}, 'delete',
+           json_object('old', json("item"."data"), 'added', json('[]'))
+    FROM "item" WHERE "category_id" = OLD."id";
+END;
+"""
+
+
+async def install_history_triggers(connection):
+    """(Re)creates the history triggers. Run after the tables exist."""
+    await connection.execute_script(HISTORY_TRIGGERS_SQL)
+
+
+def undo_diff(data, diff):
+    """Turns the 'after' data of a revision back into its 'before' data."""
+    data = dict(data)
+    for key in diff.get("added", []):
+        data.pop(key, None)
+    data.update(diff.get("old", {}))
+    return data
+
+
+def merge_diffs(diffs):
+    """Combines several diffs (oldest first) into one equivalent diff."""
+    old = {}
+    added = []
+    touched = set()
+    for diff in diffs:
+        # Only the first change to a key matters: that's what it held
+        # before the whole window
+        for key, value in diff.get("old", {}).items():
+            if key not in touched:
+                touched.add(key)
+                old[key] = value
+        for key in diff.get("added", []):
+            if key not in touched:
+                touched.add(key)
+                added.append(key)
+    return {"old": old, "added": added}
+
+
+async def data_as_of(item_id, current_data, at, created_at=None):
+    """
+    Rebuilds what an item's data looked like at time 'at', starting
+    from its current data (None if it's deleted) and undoing every
+    later revision, newest first.
+    'created_at' is the item's own creation time, for items that
+    existed before their history started (e.g. seeded ones).
+    Returns None if the item didn't exist at that time.
+    """
+    if created_at is not None and at < created_at:
+        return None
+
+    later = await ItemRevision.filter(item_id=item_id, created_at__gt=at).order_by("-id")
+
+    data = current_data or {}
+    exists = current_data is not None
+    for revision in later:
+        data = undo_diff(data, revision.diff)
+        if revision.action == "delete":
+            exists = True
+        elif revision.action == "create":
+            exists = False
+
+    return data if exists else None
+
+
+async def prune_history(now):
+    """Retention: deletes revisions older than HISTORY_RETENTION_DAYS."""
+    cutoff = now - timedelta(days=HISTORY_RETENTION_DAYS)
+    return await ItemRevision.filter(created_at__lt=cutoff).delete()
+
+
+async def compact_history(now):
+    """
+    Compaction: merges each item's revisions older than
+    HISTORY_COMPACT_DAYS into a single revision.
+    """
+    cutoff = now - timedelta(days=HISTORY_COMPACT_DAYS)
+    compacted = 0
+    while True:
+        item_ids = await (
+            ItemRevision.filter(created_at__lt=cutoff)
+            .annotate(count=Count("id"))
+            .group_by("item_id")
+            .filter(count__gt=1)
+            .limit(COMPACT_BATCH)
+            .values_list("item_id", flat=True)
+        )
+        if not item_ids:
+            return compacted
+
+        for item_id in item_ids:
+            async with in_transaction() as conn:
+                revisions = await ItemRevision.filter(
+                    item_id=item_id, created_at__lt=cutoff
+                ).order_by("id").using_db(conn)
+                if len(revisions) < 2:
+                    continue  # Already compacted by someone else
+
+                # Keep "create"/"delete" so as-of reads still know
+                # when the item existed
+                first, last = revisions[0], revisions[-1]
+                if first.action == "create" and last.action == "delete":
+                    action = None  # Created and deleted: nothing to keep
+                elif first.action == "create":
+                    action = "create"
+                elif last.action == "delete":
+                    action = "delete"
+                else:
+                    action = "update"
+
+                # The merged diff goes into the OLDEST row, so it keeps
+                # its place in the id order (reads undo newest id first)
+                keep = [first.id] if action else []
+                deleted = await ItemRevision.filter(
+                    id__in=[r.id for r in revisions if r.id not in keep]
+                ).using_db(conn).delete()
+                if deleted != len(revisions) - len(keep):
+                    # Someone else compacted this item at the same time
+                    raise RuntimeError(f"History of item {item_id} changed while compacting")
+
+                if action:
+                    # A merged "create" must still start when the item did
+                    await ItemRevision.filter(id=first.id).using_db(conn).update(
+                        created_at=first.created_at if action == "create" else last.created_at,
+                        action=action,
+                        diff=merge_diffs([r.diff for r in revisions]),
+                    )
+            compacted += 1
+
+
+async def claim_history_maintenance(now):
+    """
+    Returns True if this worker may run the maintenance now.
+    Like claim_due_reminders: the UPDATE only succeeds if the job is
+    due and nobody else holds it, so only one worker wins.
+    The first run is one interval after the job is first seen, so
+    starting the app never starts a maintenance run right away.
+    """
+    await BackgroundJob.get_or_create(
+        name="history_maintenance",
+        defaults={"next_run_at": now + timedelta(hours=MAINTENANCE_HOURS)},
+    )
+    won = await BackgroundJob.filter(
+        Q(lease_until__isnull=True) | Q(lease_until__lt=now),
+        name="history_maintenance",
+        next_run_at__lte=now,
+    ).update(lease_owner=WORKER_ID, lease_until=now + timedelta(hours=MAINTENANCE_LEASE_HOURS))
+    return bool(won)
+
+
+async def run_history_maintenance():
+    """The background loop that keeps the history table small."""
+    while True:
+        await asyncio.sleep(MAINTENANCE_CHECK_SECONDS)
+        try:
+            now = timezone.now()
+            if await claim_history_maintenance(now):
+                try:
+                    await prune_history(now)
+                    await compact_history(now)
+                finally:
+                    # Schedule the next run and give the lease back
+                    await BackgroundJob.filter(
+                        name="history_maintenance", lease_owner=WORKER_ID
+                    ).update(
+                        next_run_at=now + timedelta(hours=MAINTENANCE_HOURS),
+                        lease_owner=None,
+                        lease_until=None,
+                    )
+        except Exception as e:
+            logger.error("History maintenance failed: %s", e)
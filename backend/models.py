@@ -1,5 +1,6 @@
 from tortoise.models import Model
 from tortoise import fields
+from tortoise.validators import MinValueValidator
 
 from tortoise.contrib.pydantic import pydantic_model_creator
 from pydantic import BaseModel
@@ -72,9 +73,103 @@ class Item(Model):
     # e.g., data = {"Podcast Title": "The Daily", "Host": "Michael Barbaro", etc.}
     data = fields.JSONField()
 
+    class Meta:
+        # Lets the reminder scheduler find "old" items of ONE category
+        # without reading the whole table, already in id order
+        # (see scheduler.py)
+        indexes = (("category_id", "created_at"), ("category_id", "id"))
+
     def __str__(self):
         return f"Item {self.id} in Category {self.category_id}"
-    
+
+
+# --- Level 4: Reminder Model ---
+# A saved "digest rule" that the scheduler runs on a timer, e.g.
+# "email me about Books still 'Reading' for more than 30 days".
+# This table *is* the persistent schedule: one row per job.
+class Reminder(Model):
+    id = fields.IntField(pk=True)
+
+    owner = fields.ForeignKeyField('models.User', related_name='reminders')
+    category = fields.ForeignKeyField('models.Category', related_name='reminders')
+
+    # Which items to report: data[status_field] == status_value
+    status_field = fields.CharField(max_length=100, default="Status")
+    status_value = fields.CharField(max_length=100)
+
+    # Which "Date" field to measure age from (e.g. "Date Started").
+    # If empty, we use the item's 'created_at' column instead.
+    date_field = fields.CharField(max_length=100, null=True)
+    days = fields.IntField(default=30, validators=[MinValueValidator(0)])
+
+    # How often the digest is sent (at least once an hour)
+    interval_hours = fields.IntField(default=24, validators=[MinValueValidator(1)])
+
+    # Scheduling state (managed by scheduler.py, not by the user)
+    # 'next_run_at' is indexed so each tick only looks at due jobs.
+    next_run_at = fields.DatetimeField(db_index=True)
+    last_run_at = fields.DatetimeField(null=True)
+
+    # The "lease": a worker that claims a job writes its id and an
+    # expiry time here, so no other worker runs the same job.
+    lease_owner = fields.CharField(max_length=100, null=True)
+    lease_until = fields.DatetimeField(null=True)
+
+    # Sends that failed in a row; each one makes the next retry wait longer
+    failures = fields.IntField(default=0)
+
+    def __str__(self):
+        return f"Reminder {self.id} for Category {self.category_id}"
+
+
+# --- Level 3b: Item Revision Model ---
+# An append-only history of every change to an Item's 'data'.
+# We don't store a full copy each time, only a small "diff".
+# The rows are written by database triggers (see history.py),
+# so the history is saved in the very same statement as the change.
+class ItemRevision(Model):
+    id = fields.IntField(pk=True)
+
+    # A plain number (not a ForeignKey), so the history of an item
+    # is kept even after the item itself is deleted.
+    item_id = fields.IntField(db_index=True)
+
+    # The owner keeps the history private, even after the category is
+    # deleted (then 'category' becomes empty, but the history stays).
+    owner = fields.ForeignKeyField('models.User', related_name='revisions')
+    category = fields.ForeignKeyField('models.Category', related_name='revisions',
+                                      null=True, on_delete=fields.SET_NULL)
+
+    # Indexed for retention and compaction (see history.py)
+    created_at = fields.DatetimeField(auto_now_add=True, db_index=True)
+
+    # "create", "update" or "delete"
+    action = fields.CharField(max_length=20)
+
+    # e.g. {"old": {"Status": "Reading"}, "added": ["Notes"]}
+    diff = fields.JSONField()
+
+    def __str__(self):
+        return f"Revision {self.id} of Item {self.item_id}"
+
+
+# --- Bookkeeping: Background Job ---
+# One row per app-wide background job (e.g. "history_maintenance").
+# It works like a Reminder: 'next_run_at' says when the job is due, and
+# a worker "leases" it first, so only one copy of the app runs it.
+class BackgroundJob(Model):
+    name = fields.CharField(max_length=50, pk=True)
+    next_run_at = fields.DatetimeField()
+    lease_owner = fields.CharField(max_length=100, null=True)
+    lease_until = fields.DatetimeField(null=True)
+
+
+# --- Bookkeeping: Schema Version ---
+# A single row holding a fingerprint of our tables' SQL.
+# main.py compares it on startup and only creates tables when it changed.
+class SchemaVersion(Model):
+    id = fields.IntField(pk=True)
+    version = fields.CharField(max_length=64)
 
 
 # ----------------------------------------------------
@@ -115,4 +210,18 @@ Field_Pydantic_IN = pydantic_model_creator(Field, name="FieldIn",
 # --- Pydantic Models for ITEM (Level 3) ---
 Item_Pydantic = pydantic_model_creator(Item, name="Item")
 Item_Pydantic_IN = pydantic_model_creator(Item, name="ItemIn",
-                                          exclude_readonly=True)
\ No newline at end of file
+                                          exclude_readonly=True)
+
+ItemRevision_Pydantic = pydantic_model_creator(ItemRevision, name="ItemRevision")
+
+
+# --- Pydantic Models for REMINDER (Level 4) ---
+Reminder_Pydantic = pydantic_model_creator(Reminder, name="Reminder",
+                                           exclude=("lease_owner", "lease_until", "failures"))
+Reminder_Pydantic_IN = pydantic_model_creator(Reminder, name="ReminderIn",
+                                              exclude_readonly=True,
+                                              # The scheduler owns these
+                                              exclude=("owner", "category",
+                                                       "next_run_at", "last_run_at",
+                                                       "lease_owner", "lease_until",
+                                                       "failures"))
@@ -0,0 +1,230 @@
+# backend/scheduler.py
+
+# This file runs our saved Reminders on a timer and emails each user a
+# digest like "3 books still Reading for 30 days".
+#
+# How it stays cheap with many users:
+#   1. Each "tick" only asks the DB for reminders that are due
+#      (the 'next_run_at' column is indexed).
+#   2. A worker "leases" a reminder before running it, so if several
+#      copies of the app are running, only one of them sends the email.
+#   3. The item filters run in the database, one category at a time.
+#      We only count the matches and read the first few of them, so a
+#      huge category never ends up in memory (or in one giant email).
+
+import asyncio
+import html
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from tortoise import timezone
+from tortoise.expressions import Q
+
+from models import Item, Reminder
+
+logger = logging.getLogger(__name__)
+
+# A unique name for this running copy of the app
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+TICK_SECONDS = 60      # How often we look for due reminders
+LEASE_SECONDS = 300    # How long a claimed reminder is "ours"
+CLAIM_LIMIT = 50       # Max reminders claimed per tick
+DIGEST_ITEMS = 20      # Items listed per reminder in the email
+RETRY_MINUTES = 5      # First retry after a failed send, then doubled
+
+
+def _json_path(field_name):
+    """The SQLite JSON path for one key of Item.data, e.g. '$."Status"'."""
+    return '$."' + field_name + '"'
+
+
+def _lease_is_free(now):
+    """A reminder can be claimed if nobody holds it, or their lease ran out."""
+    return Q(lease_until__isnull=True) | Q(lease_until__lt=now)
+
+
+async def claim_due_reminders(now):
+    """
+    Finds due reminders and tries to lease each one.
+    The UPDATE only succeeds if the lease is still free, so two workers
+    can never both claim the same reminder.
+    """
+    due_ids = await (
+        Reminder.filter(_lease_is_free(now), next_run_at__lte=now)
+        .order_by("next_run_at")
+        .limit(CLAIM_LIMIT)
+        .values_list("id", flat=True)
+    )
+
+    lease_until = now + timedelta(seconds=LEASE_SECONDS)
+    claimed = []
+    for reminder_id in due_ids:
+        won = await Reminder.filter(
+            _lease_is_free(now), id=reminder_id, next_run_at__lte=now
+        ).update(lease_owner=WORKER_ID, lease_until=lease_until)
+        if won:
+            claimed.append(reminder_id)
+
+    if not claimed:
+        return []
+    return await Reminder.filter(
+        id__in=claimed, lease_owner=WORKER_ID
+    ).prefetch_related("owner", "category")
+
+
+async def find_matching_items(reminder, now):
+    """
+    Finds the items in the reminder's category whose status matches
+    and whose date is older than 'reminder.days'.
+    Both checks run inside the database (SQLite's json_extract).
+    Returns (how many match, the first DIGEST_ITEMS of them by id).
+    """
+    cutoff = now - timedelta(days=reminder.days)
+
+    # JSON paths are sent as query parameters, so any field name is safe
+    where = 'WHERE "category_id" = ? AND json_extract("data", ?) = ?'
+    params = [reminder.category_id, _json_path(reminder.status_field), reminder.status_value]
+
+    if reminder.date_field:
+        # "Date" fields are stored as "YYYY-MM-DD" strings,
+        # so we can compare them as text.
+        where += (
+            ' AND json_extract("data", ?) <> \'\''
+            ' AND substr(json_extract("data", ?), 1, 10) <= ?'
+        )
+        date_path = _json_path(reminder.date_field)
+        params += [date_path, date_path, cutoff.date().isoformat()]
+    else:
+        # No Date field chosen: use the (category_id, created_at) index
+        where += ' AND "created_at" <= ?'
+        params.append(Item._meta.fields_map["created_at"].to_db_value(cutoff, Item))
+
+    table = Item._meta.db_table
+    db = Item._meta.db
+    rows = await db.execute_query_dict(f'SELECT count(*) AS "count" FROM "{table}" {where}', params)
+    count = rows[0]["count"]
+    if not count:
+        return 0, []
+
+    # The (category_id, id) index gives these back already sorted
+    rows = await db.execute_query_dict(
+        f'SELECT "data" FROM "{table}" {where} ORDER BY "id" LIMIT {DIGEST_ITEMS}', params
+    )
+    return count, [json.loads(row["data"]) for row in rows]
+
+
+def build_digest(sections):
+    """
+    Turns a list of (reminder, count, first_items) into one email body.
+    """
+    parts = ["<h5>My Media Tracker Digest</h5>"]
+    for reminder, count, items in sections:
+        category_name = html.escape(reminder.category.name.lower())
+        parts.append(
+            f"<p><b>{count} {category_name} still "
+            f"{html.escape(reminder.status_value)} "
+            f"for {reminder.days} days</b></p>"
+        )
+        # Use each item's first value (usually its "Title") as its label
+        titles = [html.escape(str(next(iter(item.values()), ""))) for item in items]
+        if count > len(items):
+            titles.append(f"...and {count - len(items)} more")
+        parts.append("<ul>" + "".join(f"<li>{t}</li>" for t in titles) + "</ul>")
+    return "\n".join(parts)
+
+
+async def _finish(reminder, now):
+    """Schedules the next run and gives the lease back."""
+    await Reminder.filter(id=reminder.id, lease_owner=WORKER_ID).update(
+        next_run_at=now + timedelta(hours=reminder.interval_hours),
+        last_run_at=now,
+        lease_owner=None,
+        lease_until=None,
+        failures=0,
+    )
+
+
+async def _retry_later(reminder, now):
+    """
+    Gives the lease back after a failed send. Each failure in a row
+    doubles the wait, but we never wait longer than the normal interval.
+    """
+    wait = min(
+        timedelta(minutes=RETRY_MINUTES * 2 ** min(reminder.failures, 10)),
+        timedelta(hours=reminder.interval_hours),
+    )
+    await Reminder.filter(id=reminder.id, lease_owner=WORKER_ID).update(
+        next_run_at=now + wait,
+        lease_owner=None,
+        lease_until=None,
+        failures=reminder.failures + 1,
+    )
+
+
+async def _send_user_digest(user, reminders, send_message, now):
+    """Builds and sends ONE email for all of a user's due reminders."""
+    sections = []
+    for reminder in reminders:
+        count, items = await find_matching_items(reminder, now)
+        if count:
+            sections.append((reminder, count, items))
+
+    if sections:
+        # Imported here so the app starts without loading the mail library
+        from fastapi_mail import MessageSchema
+
+        message = MessageSchema(
+            subject="Your My Media Tracker digest",
+            recipients=[user.username],
+            body=build_digest(sections),
+            subtype="html",
+        )
+        try:
+            await send_message(message)
+        except Exception:
+            for reminder in reminders:
+                await _retry_later(reminder, now)
+            raise
+
+    for reminder in reminders:
+        await _finish(reminder, now)
+
+
+async def run_due_reminders(send_message):
+    """
+    Runs one "tick": claims every due reminder and sends one digest per user.
+    If sending fails, the reminder is retried later (see _retry_later).
+    """
+    now = timezone.now()
+    reminders = await claim_due_reminders(now)
+
+    by_user = defaultdict(list)
+    for reminder in reminders:
+        by_user[reminder.owner_id].append(reminder)
+
+    jobs = [
+        _send_user_digest(user_reminders[0].owner, user_reminders, send_message, now)
+        for user_reminders in by_user.values()
+    ]
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Reminder digest failed: %s", result)
+
+    return len(reminders)
+
+
+async def run_scheduler(send_message):
+    """The background loop started when the app starts."""
+    while True:
+        try:
+            await run_due_reminders(send_message)
+        except Exception as e:
+            logger.error("Reminder scheduler tick failed: %s", e)
+        await asyncio.sleep(TICK_SECONDS)
@@ -4,6 +4,8 @@ import asyncio
 from tortoise import Tortoise, run_async
 from models import User, Category, Field, Item
 from auth import get_password_hash # We need this to create the user
+from templates import CATEGORY_TEMPLATES # The "Books" fields live here
+from history import install_history_triggers # So seeded items get history too
 
 # --- Database Config (same as before) ---
 DB_CONFIG = {
@@ -28,6 +30,7 @@ async def seed_database():
         await Tortoise.init(config=DB_CONFIG)
         # This *deletes* old tables and creates new ones
         await Tortoise.generate_schemas(safe=False) 
+        await install_history_triggers(Tortoise.get_connection("default"))
         print("--- Database tables (re)created. ---")
 
         # --- 1. Create a hashed password ---
@@ -80,13 +83,10 @@ async def seed_database():
 
         # --- 4. Create Fields for "Books" ---
         print("Creating fields for 'Books' category...")
-        await Field.create(name="Title", type="Text", category=books_cat)
-        await Field.create(name="Author", type="Text", category=books_cat)
-        await Field.create(name="Status", type="Select", options=["Read", "Reading", "Unread"], category=books_cat)
-        await Field.create(name="My Rating", type="Select", options=["⭐", "⭐⭐", "⭐⭐⭐", "⭐⭐⭐⭐", "⭐⭐⭐⭐⭐"], category=books_cat)
-        await Field.create(name="Page Count", type="Number", category=books_cat)
-        await Field.create(name="Date Finished", type="Date", category=books_cat)
-        await Field.create(name="My Summary", type="Notes", category=books_cat)
+        await Field.bulk_create([
+            Field(**field_info, category=books_cat)
+            for field_info in CATEGORY_TEMPLATES["Books"]["fields"]
+        ])
 
         # --- 5. Create Items for "Books" ---
         print("Creating your 9 book items...")
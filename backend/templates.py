@@ -0,0 +1,49 @@
+# backend/templates.py
+
+# Ready-made category "structures" a user can start from,
+# instead of adding every field by hand.
+# Each template is: a description + a list of fields (name, type, options).
+
+CATEGORY_TEMPLATES = {
+    "Books": {
+        "description": "My personal collection of fiction and non-fiction.",
+        "fields": [
+            {"name": "Title", "type": "Text"},
+            {"name": "Author", "type": "Text"},
+            {"name": "Status", "type": "Select", "options": ["Read", "Reading", "Unread"]},
+            {"name": "My Rating", "type": "Select", "options": ["⭐", "⭐⭐", "⭐⭐⭐", "⭐⭐⭐⭐", "⭐⭐⭐⭐⭐"]},
+            {"name": "Page Count", "type": "Number"},
+            {"name": "Date Finished", "type": "Date"},
+            {"name": "My Summary", "type": "Notes"},
+        ],
+    },
+    "Podcasts": {
+        "description": "Shows and episodes I'm tracking.",
+        "fields": [
+            {"name": "Podcast Title", "type": "Text"},
+            {"name": "Host", "type": "Text"},
+            {"name": "Status", "type": "Select", "options": ["Listening", "Finished", "Want to Listen"]},
+            {"name": "Date Started", "type": "Date"},
+            {"name": "Notes", "type": "Notes"},
+        ],
+    },
+    "Courses": {
+        "description": "Online courses and tutorials.",
+        "fields": [
+            {"name": "Title", "type": "Text"},
+            {"name": "Platform", "type": "Text"},
+            {"name": "Status", "type": "Select", "options": ["In Progress", "Completed", "Not Started"]},
+            {"name": "Date Started", "type": "Date"},
+            {"name": "Date Finished", "type": "Date"},
+        ],
+    },
+    "Articles": {
+        "description": "Interesting articles and posts from the web.",
+        "fields": [
+            {"name": "Title", "type": "Text"},
+            {"name": "URL", "type": "Text"},
+            {"name": "Status", "type": "Select", "options": ["Read", "To Read"]},
+            {"name": "Notes", "type": "Notes"},
+        ],
+    },
+}
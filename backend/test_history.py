@@ -0,0 +1,64 @@
+# backend/test_history.py
+
+# Regression tests for the item history (history.py).
+# Run them with:  python -m pytest test_history.py
+
+import asyncio
+from datetime import timedelta
+
+from tortoise import Tortoise, timezone
+
+from history import compact_history, data_as_of, install_history_triggers
+from models import User, Category, Item, ItemRevision
+
+
+async def _setup():
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["models"]})
+    await Tortoise.generate_schemas()
+    await install_history_triggers(Tortoise.get_connection("default"))
+    user = await User.create(username="test@example.com", password="x")
+    return await Category.create(name="Books", owner=user)
+
+
+async def _set_status(item, status, days_ago):
+    """Changes the item, then moves its newest revision back in time."""
+    item.data = {"Status": status}
+    await item.save()
+    newest = await ItemRevision.filter(item_id=item.id).order_by("-id").first()
+    newest.created_at = timezone.now() - timedelta(days=days_ago)
+    await newest.save()
+
+
+def test_as_of_after_compaction():
+    async def run():
+        category = await _setup()
+        try:
+            # An item from before the history existed: no "create" revision
+            item = await Item.create(category=category, data={"Status": "v1"})
+            await ItemRevision.filter(item_id=item.id).delete()
+            await Item.filter(id=item.id).update(created_at=timezone.now() - timedelta(days=100))
+            item = await Item.get(id=item.id)
+
+            await _set_status(item, "v2", days_ago=60)
+            await _set_status(item, "v3", days_ago=40)
+            await _set_status(item, "v4", days_ago=10)
+            await compact_history(timezone.now())  # Merges v1->v2->v3 only
+
+            async def status_at(days_ago):
+                at = timezone.now() - timedelta(days=days_ago)
+                data = await data_as_of(item.id, item.data, at, created_at=item.created_at)
+                return data and data["Status"]
+
+            assert await status_at(70) == "v1"
+            assert await status_at(20) == "v3"
+            assert await status_at(5) == "v4"
+            assert await status_at(200) is None
+
+            # The history lists the newest change first
+            diffs = await ItemRevision.filter(item_id=item.id).order_by("-id").values_list("diff", flat=True)
+            assert diffs == [{"old": {"Status": "v3"}, "added": []},
+                               {"old": {"Status": "v1"}, "added": []}]
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())